@@ -4,7 +4,8 @@ import plotly.graph_objects as go
 from replay_engine import ReplayEngine
 import datetime
 from config import FILEPATH, PAGE_LAYOUT
-from utils import load_engine
+from utils import load_engine, render_precompute_progress
+from bars import product_bars
 
 # --- Constants & Config ---
 st.set_page_config(layout=PAGE_LAYOUT, page_title="Order Book Replay")
@@ -136,20 +137,16 @@ def render_y_axis_controls(history, selected_products, start_time, end_time):
     )
     return y_min, y_max
 
-def render_chart(product, history, snapshot, window_minutes, include_fragmented, y_range, end_time, p_orders):
+def render_chart(product, history, snapshot, window_minutes, include_fragmented, y_range, end_time, p_orders, bars, top):
     # Filter history for this product (time series of precomputed bests)
     p_history = history[history['Product'] == product].copy()  # Use .copy() to avoid SettingWithCopyWarning
 
-    # Compute VWAP based on the order book
-    if not p_history.empty:
-        p_history.loc[:, 'VWAP'] = (
-            (p_history['BestBid'] * p_history['BestBidQty'] + p_history['BestAsk'] * p_history['BestAskQty']) /
-            (p_history['BestBidQty'] + p_history['BestAskQty']).replace(0, float('nan'))  # Avoid division by zero
-        )
+    # Trade VWAP per bar from the precomputed trade bars
+    p_bars = product_bars(bars, product)
 
-    # Extract the current best bid and ask
-    curr_bid = p_history['BestBid'].iloc[-1] if not p_history.empty else None
-    curr_ask = p_history['BestAsk'].iloc[-1] if not p_history.empty else None
+    # Extract the current best bid and ask (as of end_time, from the bulk top-of-book query)
+    curr_bid = top['BestBid'] if pd.notna(top['BestBid']) else None
+    curr_ask = top['BestAsk'] if pd.notna(top['BestAsk']) else None
 
     # Create Plotly Chart
     fig = go.Figure()
@@ -179,13 +176,14 @@ def render_chart(product, history, snapshot, window_minutes, include_fragmented,
         ))
 
         # Add VWAP to the chart
-        fig.add_trace(go.Scatter(
-            x=plot_data['Time'],
-            y=plot_data['VWAP'],
-            mode='lines',
-            name='VWAP',
-            line=dict(color='blue', dash='dot')
-        ))
+        if not p_bars.empty:
+            fig.add_trace(go.Scatter(
+                x=p_bars.index,
+                y=p_bars['vwap'],
+                mode='lines',
+                name='VWAP',
+                line=dict(color='blue', dash='dot', shape='hv')
+            ))
 
     fig.update_layout(
         yaxis=dict(range=y_range),
@@ -230,8 +228,9 @@ def render_fragmented_controls():
 def main():
     st.title("Power Trading Replay Engine")
     
-    with st.spinner("Loading data and precomputing state..."):
+    with st.spinner("Loading data..."):
         engine = load_engine()
+    render_precompute_progress(engine)
 
     min_time = engine.min_time.to_pydatetime()
     max_time = engine.max_time.to_pydatetime()
@@ -257,6 +256,9 @@ def main():
     # Get Ticker History for the selected range
     ticker_df = engine.ticker_df
     history = ticker_df[(ticker_df['Time'] >= start_time) & (ticker_df['Time'] <= end_time)]
+    bars = engine.get_bars('1min')
+    bar_times = bars.index.get_level_values('Time')
+    bars = bars[(bar_times >= start_time) & (bar_times <= end_time)]
 
     available_products = get_available_products(engine, history, delivery_window_minutes)
     selected_products = render_product_selector(available_products)
@@ -267,15 +269,18 @@ def main():
     # Main Content
     st.subheader(f"Market State from {start_time.strftime('%Y-%m-%d %H:%M:%S')} to {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
-    # Snapshot of active orders at the end of the selected range
-    snapshot = engine.get_snapshot(end_time)
+    # Snapshot of active orders at the end of the selected range (shared across sessions)
+    snapshot = engine.get_snapshot(end_time, selected_products)
+
+    # Top of book at end_time for all selected products in one lookup
+    top_of_book = engine.get_top_of_book([end_time] * len(selected_products), selected_products)
 
     cols = st.columns(2) # 2 columns grid
     for idx, product in enumerate(selected_products):
         col = cols[idx % 2]
         with col:
             p_orders = snapshot[snapshot['Product'] == product] if not snapshot.empty else pd.DataFrame()
-            render_chart(product, history, snapshot, delivery_window_minutes, include_fragmented, y_range, end_time, p_orders)
+            render_chart(product, history, snapshot, delivery_window_minutes, include_fragmented, y_range, end_time, p_orders, bars, top_of_book.iloc[idx])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,7 +6,7 @@ from datetime import timedelta
 from replay_engine import ReplayEngine
 from config import FILEPATH
 from strategy import prepare_data_for_strategy, dual_thrust
-from utils import load_engine
+from utils import load_engine, render_precompute_progress
 
 # --- Constants & Config ---
 st.set_page_config(layout="wide", page_title="Dual Thrust Strategy Visualization")
@@ -189,6 +189,7 @@ def main():
     
     with st.spinner("Loading data..."):
         engine = load_engine()
+    render_precompute_progress(engine)
         
     selected_product, n, k1, k2, window_open_m, window_close_m, show_quarter_hour = render_sidebar(engine)
     
@@ -197,8 +198,8 @@ def main():
     ticker_df = engine.ticker_df
     trades_df = engine.trades_df
     
-    # Resample and prepare
-    strategy_data = prepare_data_for_strategy(ticker_df, trades_df, selected_product)
+    # Resample and prepare, reading trade bars precomputed alongside the ticker
+    strategy_data = prepare_data_for_strategy(ticker_df, trades_df, selected_product, bars=engine.get_bars('1min'))
     
     if not strategy_data.empty:
         # Run Strategy
@@ -0,0 +1,74 @@
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from typing import Dict, Iterable
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'trade_count', 'buy_vol', 'sell_vol', 'vwap']
+# Bars are binned from the epoch (what Series.dt.floor does); anything resampled to line up with
+# them must use the same origin, since resample defaults to the start of the first day
+BAR_ORIGIN = 'epoch'
+
+def empty_bars(freq: str) -> pd.DataFrame:
+    index = pd.MultiIndex.from_arrays([[], []], names=['Product', 'Time'])
+    bars = pd.DataFrame(columns=BAR_COLUMNS, index=index)
+    bars.attrs['freq'] = freq
+    return bars
+
+def check_bar_freq(bars: pd.DataFrame, freq: str):
+    """Raises ValueError if bars were built at a frequency other than freq."""
+    bars_freq = bars.attrs.get('freq')
+    if bars_freq is None or to_offset(bars_freq) != to_offset(freq):
+        raise ValueError(f"Bars were built at frequency {bars_freq!r}, expected {freq!r}")
+
+def build_trade_bars(trades_df: pd.DataFrame, freqs: Iterable[str]) -> Dict[str, pd.DataFrame]:
+    """
+    Builds trade-based OHLCV bars for every product at each of the given frequencies.
+    Returns {freq: DataFrame indexed by (Product, Time)} with columns BAR_COLUMNS.
+    Only bars containing at least one trade are present; vwap is weighted by traded quantity.
+    Each frame records its frequency in attrs['freq']. Bars are anchored at BAR_ORIGIN.
+    """
+    freqs = list(freqs)
+    if trades_df is None or trades_df.empty:
+        return {freq: empty_bars(freq) for freq in freqs}
+
+    # Trades are recorded in matching order; keep that order for open/close within a bar
+    trades = trades_df.sort_values('Time', kind='stable')
+    quantity = trades['Quantity']
+    is_buy = trades['Side'] == 'BUY'
+
+    # Per-trade columns shared by all frequencies so each bar set is a single groupby
+    base = pd.DataFrame({
+        'Product': trades['Product'],
+        'Price': trades['Price'],
+        'Quantity': quantity,
+        'Notional': trades['Price'] * quantity,
+        'BuyQty': quantity.where(is_buy, 0),
+        'SellQty': quantity.where(~is_buy, 0),
+    })
+
+    bars = {}
+    for freq in freqs:
+        grouped = base.groupby([base['Product'], trades['Time'].dt.floor(freq).rename('Time')], sort=True)
+        freq_bars = grouped.agg(
+            open=('Price', 'first'),
+            high=('Price', 'max'),
+            low=('Price', 'min'),
+            close=('Price', 'last'),
+            volume=('Quantity', 'sum'),
+            trade_count=('Price', 'size'),
+            buy_vol=('BuyQty', 'sum'),
+            sell_vol=('SellQty', 'sum'),
+            notional=('Notional', 'sum'),
+        )
+        freq_bars['vwap'] = freq_bars['notional'] / freq_bars['volume'].replace(0, float('nan'))
+        bars[freq] = freq_bars[BAR_COLUMNS]
+        bars[freq].attrs['freq'] = freq
+
+    return bars
+
+def product_bars(bars: pd.DataFrame, product: pd.Timestamp) -> pd.DataFrame:
+    """
+    Returns the bars of a single product indexed by Time, or an empty frame if it never traded.
+    """
+    if bars.empty or product not in bars.index.get_level_values('Product'):
+        return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], name='Time'))
+    return bars.xs(product, level='Product')
@@ -0,0 +1,184 @@
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, List
+import pandas as pd
+from replay_engine import ReplayEngine
+from dataset import resolve_files
+from strategy import prepare_data_for_strategy, dual_thrust
+from config import BATCH_OUTPUT_DIR, BAR_FREQS
+
+STAGES = ['load', 'precompute', 'prepare', 'strategy', 'write']
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def write_partition(df: pd.DataFrame, output_dir: str, table: str, dataset: str):
+    """
+    Writes one dataset partition of a table as <output_dir>/<table>/dataset=<dataset>/part-0.parquet.
+    Existing output for the same dataset is overwritten, so reruns are idempotent.
+    """
+    partition_dir = os.path.join(output_dir, table, f"dataset={dataset}")
+    os.makedirs(partition_dir, exist_ok=True)
+    df.to_parquet(os.path.join(partition_dir, "part-0.parquet"), index=False)
+
+def run_file(filepath: str, dataset: str, output_dir: str, freq: str, params: List[tuple], window_open: int, window_close: int) -> Dict:
+    """
+    Runs the full pipeline for one order file: load, precompute, bar preparation and
+    Dual Thrust for every product and parameter set, then writes the results under the dataset partition.
+    Returns the dataset name, row counts and per-stage timings in seconds.
+    """
+    timings: Dict[str, float] = {}
+    engine = ReplayEngine(filepath)
+
+    with timed(timings, 'load'):
+        engine.load_data()
+    with timed(timings, 'precompute'):
+        engine.precompute_ticker()
+        bars = engine.get_bars(freq)
+
+    trading_window_open = timedelta(minutes=window_open)
+    trading_window_close = timedelta(minutes=window_close)
+    signal_frames = []
+    for product in engine.products:
+        product = pd.Timestamp(product)
+        with timed(timings, 'prepare'):
+            strategy_data = prepare_data_for_strategy(engine.ticker_df, engine.trades_df, product, freq, bars=bars)
+        if strategy_data.empty:
+            continue
+        with timed(timings, 'strategy'):
+            for n, k1, k2 in params:
+                signals, upper_band, lower_band = dual_thrust(strategy_data, n, k1, k2, product, trading_window_open, trading_window_close)
+                if signals is None or signals.empty:
+                    continue
+                frame = pd.DataFrame({'Signal': signals, 'Upper': upper_band, 'Lower': lower_band})
+                frame.index.name = 'Time'
+                frame = frame.reset_index()
+                frame.insert(1, 'Product', product)
+                frame['n'] = n
+                frame['k1'] = k1
+                frame['k2'] = k2
+                signal_frames.append(frame)
+
+    signals_df = pd.concat(signal_frames, ignore_index=True) if signal_frames else pd.DataFrame(
+        columns=['Time', 'Product', 'Signal', 'Upper', 'Lower', 'n', 'k1', 'k2'])
+
+    with timed(timings, 'write'):
+        write_partition(engine.ticker_df, output_dir, 'ticker', dataset)
+        write_partition(engine.trades_df, output_dir, 'trades', dataset)
+        write_partition(bars.reset_index(), output_dir, f'bars_{freq}', dataset)
+        write_partition(signals_df, output_dir, 'signals', dataset)
+
+    return {
+        'dataset': dataset,
+        'events': len(engine.df),
+        'ticker': len(engine.ticker_df),
+        'trades': len(engine.trades_df),
+        'signals': len(signals_df),
+        'timings': timings,
+    }
+
+def expand_files(patterns: List[str]) -> List[str]:
+    """Expands file paths, directories and glob patterns into a sorted list of order files."""
+    files = []
+    for pattern in patterns:
+        files.extend(f for f in resolve_files(pattern) if os.path.isfile(f))
+    return sorted(set(files))
+
+def partition_names(files: List[str]) -> Dict[str, str]:
+    """
+    Returns the output partition name of each file: its stem, or for files sharing a stem,
+    the path below their common directory (e.g. day1-orders and day2-orders for day1/orders.csv and day2/orders.csv).
+    Raises ValueError if names still collide.
+    """
+    by_stem: Dict[str, List[str]] = {}
+    for f in files:
+        by_stem.setdefault(os.path.splitext(os.path.basename(f))[0], []).append(f)
+
+    names = {}
+    for stem, group in by_stem.items():
+        if len(group) == 1:
+            names[group[0]] = stem
+            continue
+        common = os.path.commonpath([os.path.abspath(f) for f in group])
+        for f in group:
+            relative = os.path.splitext(os.path.relpath(os.path.abspath(f), common))[0]
+            names[f] = relative.replace(os.sep, '-')
+
+    collisions = sorted(n for n in set(names.values()) if list(names.values()).count(n) > 1)
+    if collisions:
+        raise ValueError(f"Files map to the same output partition: {collisions}")
+    return names
+
+def print_report(results: List[Dict], failures: List[Dict], wall_time: float):
+    report = pd.DataFrame([{'dataset': r['dataset'], 'events': r['events'], 'trades': r['trades'], 'signals': r['signals'],
+                            **{s: round(r['timings'].get(s, 0.0), 3) for s in STAGES}} for r in results],
+                          columns=['dataset', 'events', 'trades', 'signals', *STAGES])
+    print(report.to_string(index=False))
+    print("Total stage time (s): " + ", ".join(f"{s}={report[s].sum():.3f}" for s in STAGES))
+    print(f"Wall time: {wall_time:.3f}s for {len(results) + len(failures)} files")
+    if failures:
+        print(f"{len(failures)} files failed:")
+        for failure in failures:
+            print(f"  {failure['file']}: {failure['error']!r}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run precompute, trade bars and Dual Thrust over order files without the UI.")
+    parser.add_argument('files', nargs='+', help="Order files, directories or glob patterns")
+    parser.add_argument('-o', '--output', default=BATCH_OUTPUT_DIR, help="Output directory for partitioned parquet tables")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--freq', default=BAR_FREQS[0], help="Bar frequency for the strategy")
+    parser.add_argument('--n', type=int, nargs='+', default=[15], help="Lookback period(s) in minutes")
+    parser.add_argument('--k1', type=float, nargs='+', default=[0.5], help="Upper band coefficient(s)")
+    parser.add_argument('--k2', type=float, nargs='+', default=[0.5], help="Lower band coefficient(s)")
+    parser.add_argument('--window-open', type=int, default=60, help="Trading window open (minutes before delivery)")
+    parser.add_argument('--window-close', type=int, default=15, help="Trading window close (minutes before delivery)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = expand_files(args.files)
+    if not files:
+        raise SystemExit(f"No order files matched {args.files}")
+    try:
+        datasets = partition_names(files)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    # Every combination of n, k1 and k2 is one sweep point
+    params = list(itertools.product(args.n, args.k1, args.k2))
+    print(f"Running {len(files)} files x {len(params)} parameter sets with {args.workers} workers...")
+
+    start = time.perf_counter()
+    results, failures = [], []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(run_file, f, datasets[f], args.output, args.freq, params, args.window_open, args.window_close): f
+            for f in files
+        }
+        for future in as_completed(futures):
+            # A bad file is reported at the end rather than aborting the files still running
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Failed {futures[future]}: {e!r}")
+                failures.append({'file': futures[future], 'error': e})
+                continue
+            print(f"Finished {result['dataset']}")
+            results.append(result)
+
+    print_report(sorted(results, key=lambda r: r['dataset']), sorted(failures, key=lambda f: f['file']), time.perf_counter() - start)
+    if failures:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,39 @@
 import os
+import tempfile
 
 # Data Configuration
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 DEFAULT_DATA_FILE = "Continuous_Orders-NL-20210626-20210628T042947000Z.csv"
 FILEPATH = os.path.join(DATA_DIR, DEFAULT_DATA_FILE)
+# Dataset loaded by the apps: a single file, a directory or a glob pattern,
+# e.g. os.path.join(DATA_DIR, "Continuous_Orders-NL-*.csv") for several days
+DATASET = FILEPATH
 
 # App Configuration
 PAGE_LAYOUT = "wide"
+
+# Snapshot Cache Configuration
+# Query times are floored to this resolution before lookup
+SNAPSHOT_CACHE_QUANTUM = "1s"
+SNAPSHOT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Trade Bar Configuration
+# Frequencies built alongside the ticker in precompute_ticker
+BAR_FREQS = ["1min", "5min", "15min"]
+
+# Batch Configuration
+BATCH_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'output')
+
+# Shadow Mode Configuration
+# Events per comparison chunk; compared output is released after each chunk
+SHADOW_CHUNK_SIZE = 10000
+
+# Shared Results Configuration
+# Published frames are memory-mapped by every app process; /dev/shm keeps them in RAM
+SHARED_FRAMES_DIR = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'dt-power')
+
+# Background Precompute Configuration
+# Events matched between progressive publishes of ticker and trades
+PRECOMPUTE_CHUNK_SIZE = 20000
+# Seconds between progress refreshes while precompute is still running
+PROGRESS_REFRESH_SECONDS = 5
@@ -0,0 +1,92 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+
+TIME_COLS = ['DeliveryStart', 'DeliveryEnd', 'CreationTime', 'TransactionTime', 'ValidityTime']
+
+def resolve_files(path: str) -> List[str]:
+    """
+    Resolves a dataset path into a sorted list of order files.
+    The path may be a single file, a directory of CSV files or a glob pattern.
+    """
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*.csv')))
+    if glob.has_magic(path):
+        return sorted(glob.glob(path))
+    return [path]
+
+def source_state(files: List[str]) -> List[List]:
+    """Identifies a dataset's contents by the absolute path, mtime and size of each file."""
+    return [[os.path.abspath(f), os.path.getmtime(f), os.path.getsize(f)] for f in files]
+
+def load_order_file(filepath: str) -> pd.DataFrame:
+    """Loads one order file, parses its time columns and sorts it into event order."""
+    # Skip the first line which is a comment
+    df = pd.read_csv(filepath, skiprows=1, low_memory=False)
+
+    # Parse dates
+    for col in TIME_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+
+    # Sort by TransactionTime and RevisionNo to ensure correct order
+    df = df.sort_values(['TransactionTime', 'RevisionNo'])
+    df['SourceFile'] = os.path.basename(filepath)
+    return df
+
+def _time_keys(times: pd.Series) -> np.ndarray:
+    # Nanoseconds since epoch (UTC) so files parsed with different resolutions compare correctly
+    if times.dt.tz is not None:
+        times = times.dt.tz_convert('UTC').dt.tz_localize(None)
+    return times.to_numpy(dtype='datetime64[ns]').view('int64')
+
+def _merge_two(a_keys: np.ndarray, a_rows: np.ndarray, b_keys: np.ndarray, b_rows: np.ndarray):
+    # Final position of each element is its own index plus the number of elements of the
+    # other run that precede it; ties keep run a first so the merge is stable
+    pos_a = np.arange(len(a_keys)) + np.searchsorted(b_keys, a_keys, side='left')
+    pos_b = np.arange(len(b_keys)) + np.searchsorted(a_keys, b_keys, side='right')
+
+    keys = np.empty(len(a_keys) + len(b_keys), dtype=a_keys.dtype)
+    rows = np.empty(len(keys), dtype=a_rows.dtype)
+    keys[pos_a], keys[pos_b] = a_keys, b_keys
+    rows[pos_a], rows[pos_b] = a_rows, b_rows
+    return keys, rows
+
+def merge_order(runs: List[np.ndarray]) -> np.ndarray:
+    """
+    K-way merges already sorted key arrays without re-sorting them.
+    Returns positions into the concatenation of the runs in merged order.
+    Runs are merged pairwise in a balanced tree, so each element moves log2(k) times.
+    """
+    offsets = np.cumsum([0] + [len(r) for r in runs[:-1]])
+    pending = [(keys, np.arange(len(keys)) + offset) for keys, offset in zip(runs, offsets)]
+    if not pending:
+        return np.arange(0)
+
+    while len(pending) > 1:
+        merged = [_merge_two(*pending[i], *pending[i + 1]) for i in range(0, len(pending) - 1, 2)]
+        if len(pending) % 2:
+            merged.append(pending[-1])
+        pending = merged
+    return pending[0][1]
+
+def load_dataset(files: List[str], workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Loads several order files in parallel worker processes and merges them into a single
+    event stream ordered by TransactionTime. Each event keeps its origin in 'SourceFile'.
+    """
+    if len(files) == 1:
+        frames = [load_order_file(files[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or min(len(files), os.cpu_count())) as pool:
+            frames = list(pool.map(load_order_file, files))
+
+    # Each file is already sorted; revisions of one order never span files, so merging
+    # on TransactionTime alone preserves the per-file (TransactionTime, RevisionNo) order
+    order = merge_order([_time_keys(f['TransactionTime']) for f in frames])
+    df = pd.concat(frames, ignore_index=True).take(order).reset_index(drop=True)
+    df['SourceFile'] = pd.Categorical(df['SourceFile'], categories=list(dict.fromkeys(os.path.basename(f) for f in files)))
+    return df
@@ -1,8 +1,12 @@
+import heapq
 from typing import List, Dict, Tuple, Optional
 import pandas as pd
 
+TICKER_COLUMNS = ['Time', 'Product', 'BestBid', 'BestAsk', 'BestBidQty', 'BestAskQty']
+TRADE_COLUMNS = ['Time', 'Product', 'Price', 'Quantity', 'Side']
+
 class MatchingEngine:
-    def __init__(self):
+    def __init__(self, expire_orders: bool = True, amend_in_place: bool = True):
         # Order Books per product: {Product: {'bids': [], 'asks': []}}
         # List items: [Price, Time, InitialId, Quantity]
         # Bids sorted by Price DESC, Time ASC
@@ -10,7 +14,7 @@ class MatchingEngine:
         self.books: Dict[str, Dict[str, List]] = {}
         
         # Map InitialId to Order details for quick deletion/lookup
-        # InitialId -> {'Product': p, 'Side': s, 'Price': p, 'Quantity': q, 'Time': t}
+        # InitialId -> {'Product': p, 'Side': s, 'Price': p, 'Quantity': q, 'Time': t, 'Entry': book list item}
         self.order_lookup: Dict[int, Dict] = {}
         
         self.trades: List[Dict] = []
@@ -18,6 +22,16 @@ class MatchingEngine:
         
         # Current Best Prices cache: {Product: (BestBid, BestAsk, BestBidQty, BestAskQty)}
         self.current_best: Dict[str, Tuple] = {}
+        
+        # Expiry timers: min-heap of (ValidityTime ns, InitialId) for resting orders
+        # Entries are dropped lazily when the order was removed or re-added with another validity
+        self.expire_orders = expire_orders
+        self.expiry_heap: List[Tuple[int, int]] = []
+        self.last_time: Optional[pd.Timestamp] = None
+        
+        # Quantity-only reductions keep time priority and skip the remove/re-add path;
+        # False restores the previous behaviour where every revision re-queues the order
+        self.amend_in_place = amend_in_place
 
     def process_event(self, row: pd.Series):
         initial_id = row['InitialId']
@@ -27,20 +41,68 @@ class MatchingEngine:
         side = row['Side']
         product = row['DeliveryStart']
         time = row['TransactionTime']
+        validity = row.get('ValidityTime') if self.expire_orders else None
         
         if product not in self.books:
             self.books[product] = {'bids': [], 'asks': []}
         
-        # 1. Handle Deletion / Modification (Remove old version first)
-        if initial_id in self.order_lookup:
-            self._remove_order(initial_id)
+        # 0. Expire orders whose validity ended before this event
+        if self.expire_orders:
+            self._expire_orders(time)
+        
+        # 1. Fast path: quantity reduction at the same price is applied in place, keeping time priority
+        amended = self.amend_in_place and action == 'M' and self._reduce_quantity(initial_id, product, side, price, quantity)
+        if not amended:
+            # 2. Handle Deletion / Modification (Remove old version first)
+            if initial_id in self.order_lookup:
+                self._remove_order(initial_id)
 
-        # 2. Handle Add / Modify (Insert new version and Match)
-        if action in ['A', 'M'] and quantity > 0:
-            self._match_and_add_order(product, side, price, quantity, time, initial_id)
+            # 3. Handle Add / Modify (Insert new version and Match)
+            if action in ['A', 'M'] and quantity > 0:
+                self._match_and_add_order(product, side, price, quantity, time, initial_id)
+        
+        # Arm the expiry timer of a resting order when its validity is new or changed
+        order = self.order_lookup.get(initial_id)
+        if order is not None and validity is not None and not pd.isna(validity) and order.get('ValidityTime') != validity.value:
+            order['ValidityTime'] = validity.value
+            heapq.heappush(self.expiry_heap, (validity.value, initial_id))
         
-        # 3. Record Ticker State
+        # 4. Record Ticker State
         self._update_ticker(product, time)
+        self.last_time = time
+
+    def _expire_orders(self, time: pd.Timestamp):
+        """Removes every resting order whose ValidityTime is earlier than time, recording ticker changes."""
+        now = time.value
+        heap = self.expiry_heap
+        while heap and heap[0][0] < now:
+            validity, initial_id = heapq.heappop(heap)
+            order = self.order_lookup.get(initial_id)
+            # Stale entry: order already gone or re-added with a different validity
+            if order is None or order.get('ValidityTime') != validity:
+                continue
+            product = order['Product']
+            self._remove_order(initial_id)
+            
+            # Stamp the change at the expiry, never before the last processed event
+            expiry_time = pd.Timestamp(validity, tz=time.tz)
+            if self.last_time is not None and expiry_time < self.last_time:
+                expiry_time = self.last_time
+            self._update_ticker(product, expiry_time)
+
+    def _reduce_quantity(self, initial_id: int, product: str, side: str, price: float, quantity: int) -> bool:
+        """
+        Lowers the quantity of a resting order in place if only its quantity went down.
+        Returns False when the amendment needs the full remove and re-add path.
+        """
+        order = self.order_lookup.get(initial_id)
+        if (order is None or order['Product'] != product or order['Side'] != side
+                or order['Price'] != price or not 0 < quantity < order['Quantity']):
+            return False
+        # The book entry is shared with the lookup, so no search or re-sort is needed
+        order['Entry'][3] = quantity
+        order['Quantity'] = quantity
+        return True
 
     def _remove_order(self, initial_id: int):
         old_order = self.order_lookup[initial_id]
@@ -95,7 +157,7 @@ class MatchingEngine:
                 self.books[product]['bids'].sort(key=lambda x: (-x[0], x[1]))
                 
                 self.order_lookup[initial_id] = {
-                    'Product': product, 'Side': 'BUY', 'Price': price, 'Quantity': remaining_qty, 'Time': time
+                    'Product': product, 'Side': 'BUY', 'Price': price, 'Quantity': remaining_qty, 'Time': time, 'Entry': new_order
                 }
 
         else: # SELL
@@ -134,7 +196,7 @@ class MatchingEngine:
                 self.books[product]['asks'].sort(key=lambda x: (x[0], x[1]))
                 
                 self.order_lookup[initial_id] = {
-                    'Product': product, 'Side': 'SELL', 'Price': price, 'Quantity': remaining_qty, 'Time': time
+                    'Product': product, 'Side': 'SELL', 'Price': price, 'Quantity': remaining_qty, 'Time': time, 'Entry': new_order
                 }
 
     def _record_trade(self, time, product, price, quantity, side):
@@ -167,5 +229,10 @@ class MatchingEngine:
                 'BestAskQty': best_ask_qty
             })
 
+    def get_book(self, product: str, depth: int = 5) -> Tuple[List, List]:
+        """Returns the top depth levels of bids and asks for a product as [Price, Time, InitialId, Quantity] lists."""
+        book = self.books.get(product, {'bids': [], 'asks': []})
+        return [list(o) for o in book['bids'][:depth]], [list(o) for o in book['asks'][:depth]]
+
     def get_results(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        return pd.DataFrame(self.ticker_data), pd.DataFrame(self.trades)
+        return pd.DataFrame(self.ticker_data, columns=TICKER_COLUMNS), pd.DataFrame(self.trades, columns=TRADE_COLUMNS)
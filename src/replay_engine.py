@@ -1,44 +1,136 @@
+import threading
+import time
 import pandas as pd
 import numpy as np
-from typing import List, Optional
-from matching_engine import MatchingEngine
+from typing import Callable, Dict, List, Optional
+from matching_engine import MatchingEngine, TICKER_COLUMNS, TRADE_COLUMNS
+from snapshot_cache import SnapshotCache
+from bars import build_trade_bars
+from dataset import resolve_files, load_dataset, source_state
+from config import SNAPSHOT_CACHE_QUANTUM, SNAPSHOT_CACHE_MAX_BYTES, BAR_FREQS, PRECOMPUTE_CHUNK_SIZE
+
+def _align_datetimes(values: pd.Series, dtype) -> pd.Series:
+    target_tz = getattr(dtype, 'tz', None)
+    if values.dt.tz is None and target_tz is not None:
+        values = values.dt.tz_localize(target_tz)
+    elif values.dt.tz is not None:
+        values = values.dt.tz_convert(target_tz) if target_tz is not None else values.dt.tz_convert('UTC').dt.tz_localize(None)
+    return values.astype(dtype)
+
+class ChunkedFrame:
+    """
+    A frame built up chunk by chunk. Appending only stores the chunk; the chunks are concatenated
+    when the frame is read, and that result is reused until the next append.
+    The parts tuple is replaced rather than mutated, so a reader always sees a consistent set of chunks.
+    """
+    def __init__(self, columns: List[str], frame: Optional[pd.DataFrame] = None):
+        self.columns = columns
+        self.parts: tuple = (frame,) if frame is not None else ()
+        # (parts it was built from, concatenated frame)
+        self._view: Optional[tuple] = None
+
+    def append(self, chunk: pd.DataFrame):
+        if not chunk.empty:
+            self.parts = self.parts + (chunk,)
+
+    def frame(self) -> pd.DataFrame:
+        parts, view = self.parts, self._view
+        if view is not None and view[0] is parts:
+            return view[1]
+        if not parts:
+            frame = pd.DataFrame(columns=self.columns)
+        elif len(parts) == 1:
+            frame = parts[0]
+        else:
+            frame = pd.concat(parts, ignore_index=True)
+        self._view = (parts, frame)
+        return frame
 
 class ReplayEngine:
+    # Process-wide snapshot cache shared by all engines and sessions
+    snapshot_cache = SnapshotCache(SNAPSHOT_CACHE_MAX_BYTES)
+
     def __init__(self, filepath: str):
+        # A single order file, a directory of order files or a glob pattern
         self.filepath = filepath
+        self.files: List[str] = resolve_files(filepath)
+        # Identity of the loaded contents (files with mtimes and sizes), part of every snapshot cache key
+        self.data_version: Optional[tuple] = None
         self.df: Optional[pd.DataFrame] = None
         self.min_time: Optional[pd.Timestamp] = None
         self.max_time: Optional[pd.Timestamp] = None
         self.products: Optional[List[pd.Timestamp]] = None
         self.products_with_duration: Optional[pd.DataFrame] = None
-        self.ticker_df: Optional[pd.DataFrame] = None
-        self.trades_df: Optional[pd.DataFrame] = None
-
-    def load_data(self):
-        """Loads and preprocesses the data from the CSV file."""
-        # Skip the first line which is a comment
-        self.df = pd.read_csv(self.filepath, skiprows=1, low_memory=False)
+        # Ticker and trades as chunks, exposed as frames through ticker_df and trades_df
+        self._ticker: Optional[ChunkedFrame] = None
+        self._trades: Optional[ChunkedFrame] = None
+        # Trade bars per frequency: {freq: DataFrame indexed by (Product, Time)}
+        self.bars: Dict[str, pd.DataFrame] = {}
+        # (ticker_df it was built from, ticker sorted by Time) for as-of lookups, built on first use
+        self._asof_ticker: Optional[tuple] = None
         
-        # Parse dates
-        time_cols = ['DeliveryStart', 'DeliveryEnd', 'CreationTime', 'TransactionTime', 'ValidityTime']
-        for col in time_cols:
-            if col in self.df.columns:
-                self.df[col] = pd.to_datetime(self.df[col])
-                
+        # Precompute progress; ticker_df and trades_df cover events up to processed_until while running
+        self.events_processed = 0
+        self.processed_until: Optional[pd.Timestamp] = None
+        self.precompute_done = False
+        self.precompute_error: Optional[BaseException] = None
+        self._precompute_started: Optional[float] = None
+
+    @property
+    def ticker_df(self) -> Optional[pd.DataFrame]:
+        ticker = self._ticker
+        return ticker.frame() if ticker is not None else None
+
+    @ticker_df.setter
+    def ticker_df(self, frame: Optional[pd.DataFrame]):
+        self._ticker = ChunkedFrame(TICKER_COLUMNS, frame) if frame is not None else None
+
+    @property
+    def trades_df(self) -> Optional[pd.DataFrame]:
+        trades = self._trades
+        return trades.frame() if trades is not None else None
+
+    @trades_df.setter
+    def trades_df(self, frame: Optional[pd.DataFrame]):
+        self._trades = ChunkedFrame(TRADE_COLUMNS, frame) if frame is not None else None
+
+    def load_data(self, workers: Optional[int] = None):
+        """
+        Loads and preprocesses the data from the dataset's CSV files.
+        Files are parsed in parallel and merged into one event stream ordered by TransactionTime.
+        """
+        # Re-resolve so files added to a directory or glob since construction are picked up
+        self.files = resolve_files(self.filepath)
+        if not self.files:
+            raise FileNotFoundError(f"No order files found for {self.filepath}")
+        self.df = load_dataset(self.files, workers)
+        self._init_metadata()
+
+    def _init_metadata(self):
+        """Derives time range and product lists from the loaded events."""
+        self.data_version = tuple(tuple(state) for state in source_state(self.files))
+        # Snapshots of earlier loads of this dataset no longer apply
+        self.snapshot_cache.clear(self.filepath)
         self.min_time = self.df['TransactionTime'].min()
         self.max_time = self.df['DeliveryEnd'].max()
         self.products = sorted(self.df['DeliveryStart'].unique())
         self.products_with_duration = self.df[['DeliveryStart', 'DeliveryEnd']].drop_duplicates().sort_values('DeliveryStart').reset_index(drop=True)
-        
-        # Sort by TransactionTime and RevisionNo to ensure correct order
-        self.df = self.df.sort_values(['TransactionTime', 'RevisionNo'])
 
-    def get_snapshot(self, query_time: pd.Timestamp) -> pd.DataFrame:
+    def get_snapshot(self, query_time: pd.Timestamp, products: Optional[List[pd.Timestamp]] = None) -> pd.DataFrame:
         """
-        Returns the active orders at a specific time.
+        Returns the active orders at a specific time, optionally restricted to the given products.
+        The query time is floored to SNAPSHOT_CACHE_QUANTUM and results are served from the shared snapshot cache.
         """
+        query_time = pd.Timestamp(query_time).floor(SNAPSHOT_CACHE_QUANTUM)
+        product_key = frozenset(pd.Timestamp(p) for p in products) if products is not None else None
+        key = (self.filepath, self.data_version, query_time, product_key)
+        return self.snapshot_cache.get_or_compute(key, lambda: self._compute_snapshot(query_time, product_key))
+
+    def _compute_snapshot(self, query_time: pd.Timestamp, products: Optional[frozenset] = None) -> pd.DataFrame:
         # Filter events up to query_time
         mask = self.df['TransactionTime'] <= query_time
+        if products is not None:
+            mask &= self.df['DeliveryStart'].isin(list(products))
         df_past = self.df.loc[mask]
         
         if df_past.empty:
@@ -48,28 +140,168 @@ class ReplayEngine:
         latest_states = df_past.groupby('InitialId').last()
         
         # Filter for active orders
-        active_orders = latest_states[
-            (latest_states['ActionCode'].isin(['A', 'M'])) & 
-            (latest_states['Quantity'] > 0)
-        ]
+        active_mask = (latest_states['ActionCode'].isin(['A', 'M'])) & (latest_states['Quantity'] > 0)
+        # Orders past their ValidityTime have expired, matching MatchingEngine's expiry
+        if 'ValidityTime' in latest_states.columns:
+            active_mask &= ~(latest_states['ValidityTime'] < query_time)
+        active_orders = latest_states[active_mask]
         
         return active_orders
 
-    def precompute_ticker(self) -> pd.DataFrame:
+    def precompute_ticker(self, chunk_size: int = PRECOMPUTE_CHUNK_SIZE, progressive: bool = False,
+                          on_chunk: Optional[Callable[[pd.DataFrame, pd.DataFrame], None]] = None) -> pd.DataFrame:
         """
         Iterates through all events to generate a history of Best Bid/Ask changes.
         Delegates matching logic to MatchingEngine.
+        Progress is updated every chunk_size events. With progressive=True the ticker and trades of
+        each chunk are also appended to the engine's frames, so readers can use the processed part
+        of the day while matching continues; start_precompute uses this, batch runs do not.
+        on_chunk, which implies progressive, is called with each chunk's new ticker and trades.
         Returns a DataFrame with columns: [Time, Product, BestBid, BestAsk, BestBidQty, BestAskQty]
         """
         matching_engine = MatchingEngine()
+        progressive = progressive or on_chunk is not None
         
         total_rows = len(self.df)
         print(f"Precomputing ticker with matching for {total_rows} events...")
+        self._reset_progress()
         
-        for idx, row in self.df.iterrows():
-            matching_engine.process_event(row)
+        for start in range(0, total_rows, chunk_size):
+            chunk = self.df.iloc[start:start + chunk_size]
+            for idx, row in chunk.iterrows():
+                matching_engine.process_event(row)
+            if progressive:
+                new_ticker, new_trades = self._publish_chunk(matching_engine)
+            self.events_processed = start + len(chunk)
+            self.processed_until = chunk['TransactionTime'].iloc[-1]
+            if on_chunk is not None:
+                on_chunk(new_ticker, new_trades)
                 
-        self.ticker_df, self.trades_df = matching_engine.get_results()
+        ticker_df, trades_df = matching_engine.get_results()
+        self._publish_results(ticker_df, trades_df, build_trade_bars(trades_df, BAR_FREQS))
+        self.precompute_done = True
         print(f"Precomputation complete. Generated {len(self.ticker_df)} ticker events and {len(self.trades_df)} trades.")
         return self.ticker_df
 
+    def _reset_progress(self):
+        self._precompute_started = time.perf_counter()
+        self.precompute_done = False
+        self.precompute_error = None
+        self.events_processed = 0
+        self.processed_until = None
+        # Empty chunked frames for the chunks matched from here on
+        self._trades = ChunkedFrame(TRADE_COLUMNS)
+        self._ticker = ChunkedFrame(TICKER_COLUMNS)
+        self.bars = {}
+
+    def _publish_chunk(self, matching_engine: MatchingEngine) -> tuple:
+        # Append only the records produced since the last publish; earlier chunks are not copied
+        ticker, trades = self._ticker, self._trades
+        published_ticker = sum(len(part) for part in ticker.parts)
+        published_trades = sum(len(part) for part in trades.parts)
+        new_ticker = pd.DataFrame(matching_engine.ticker_data[published_ticker:], columns=TICKER_COLUMNS)
+        new_trades = pd.DataFrame(matching_engine.trades[published_trades:], columns=TRADE_COLUMNS)
+        # Chunks where one side of a book stayed empty would otherwise hold object columns of None
+        new_ticker = new_ticker.astype({'BestBid': float, 'BestAsk': float})
+        # Trades go first, as in _publish_results; bars are rebuilt on demand from the extended trades
+        trades.append(new_trades)
+        ticker.append(new_ticker)
+        self.bars = {}
+        return new_ticker, new_trades
+
+    def _publish_results(self, ticker_df: pd.DataFrame, trades_df: pd.DataFrame, bars: Dict[str, pd.DataFrame]):
+        # Frames are replaced or appended to, never mutated, so readers holding a reference keep a consistent view.
+        # trades_df goes before bars so a reader that sees the new bars dict also sees the new trades.
+        self.trades_df = trades_df
+        self.ticker_df = ticker_df
+        self.bars = bars
+
+    def start_precompute(self, chunk_size: int = PRECOMPUTE_CHUNK_SIZE,
+                         on_chunk: Optional[Callable[[pd.DataFrame, pd.DataFrame], None]] = None) -> threading.Thread:
+        """
+        Runs precompute_ticker in a background thread and returns it immediately.
+        on_chunk is passed to precompute_ticker.
+        """
+        def run():
+            try:
+                self.precompute_ticker(chunk_size, progressive=True, on_chunk=on_chunk)
+            except BaseException as e:
+                self.precompute_error = e
+                raise
+
+        # Readers get empty frames straight away rather than None
+        self._reset_progress()
+        thread = threading.Thread(target=run, name=f"precompute-{self.filepath}", daemon=True)
+        thread.start()
+        return thread
+
+    def get_progress(self) -> Dict:
+        """Returns precompute progress: processed/total events, processed_until, elapsed and ETA in seconds."""
+        total = len(self.df) if self.df is not None else 0
+        processed = total if self.precompute_done else self.events_processed
+        elapsed = time.perf_counter() - self._precompute_started if self._precompute_started is not None else 0.0
+        eta = elapsed / processed * (total - processed) if processed else None
+        return {
+            'processed': processed,
+            'total': total,
+            'fraction': processed / total if total else 1.0,
+            'processed_until': self.processed_until,
+            'elapsed': elapsed,
+            'eta': 0.0 if self.precompute_done else eta,
+            'done': self.precompute_done,
+            'error': self.precompute_error,
+        }
+
+    def get_bars(self, freq: str = '1min') -> pd.DataFrame:
+        """
+        Returns trade-based OHLCV/VWAP bars for all products at the given frequency.
+        Frequencies not listed in BAR_FREQS are built on first use and cached.
+        """
+        # Read bars before trades: while precompute publishes, a fresh bars dict implies fresh trades
+        bars = self.bars
+        if freq not in bars:
+            bars[freq] = build_trade_bars(self.trades_df, [freq])[freq]
+        return bars[freq]
+
+    def get_top_of_book(self, times, products) -> pd.DataFrame:
+        """
+        Returns the best bid/ask and quantities in effect for each (time, product) pair.
+        times and products are equal-length array-likes; all pairs are resolved in one as-of join
+        against the ticker. Returns columns [Time, Product, BestBid, BestAsk, BestBidQty, BestAskQty]
+        in query order, with NaN where a product had no book state yet.
+        """
+        ticker_df = self.ticker_df
+        if self._asof_ticker is None or self._asof_ticker[0] is not ticker_df:
+            self._asof_ticker = (ticker_df, ticker_df.sort_values('Time', kind='stable').reset_index(drop=True))
+        ticker = self._asof_ticker[1]
+
+        queries = pd.DataFrame({
+            'Time': pd.to_datetime(pd.Series(times)),
+            'Product': pd.to_datetime(pd.Series(products)),
+        })
+        if ticker.empty:
+            return queries.reindex(columns=['Time', 'Product', 'BestBid', 'BestAsk', 'BestBidQty', 'BestAskQty'])
+        # Align query dtypes with the ticker (timezone and resolution) as merge_asof requires
+        for col in ('Time', 'Product'):
+            queries[col] = _align_datetimes(queries[col], ticker[col].dtype)
+        queries['_order'] = range(len(queries))
+
+        result = pd.merge_asof(
+            queries.sort_values('Time', kind='stable'),
+            ticker,
+            on='Time',
+            by='Product',
+            direction='backward',
+        )
+        return result.sort_values('_order').drop(columns='_order').reset_index(drop=True)
+
+    def get_price_surface(self, times, products: Optional[List[pd.Timestamp]] = None, field: str = 'BestBid') -> pd.DataFrame:
+        """
+        Returns a times x products frame of one top-of-book field (e.g. a products x minutes price surface).
+        Defaults to all products.
+        """
+        products = self.products if products is None else products
+        times = pd.DatetimeIndex(times)
+        grid = pd.MultiIndex.from_product([times, products], names=['Time', 'Product'])
+        top = self.get_top_of_book(grid.get_level_values('Time'), grid.get_level_values('Product'))
+        return top.pivot(index='Time', columns='Product', values=field)
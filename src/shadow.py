@@ -0,0 +1,183 @@
+import argparse
+import ast
+import functools
+import importlib
+import time
+from typing import Callable, Dict, List, Optional
+import pandas as pd
+from matching_engine import MatchingEngine
+from replay_engine import ReplayEngine
+from config import DATASET, SHADOW_CHUNK_SIZE
+
+def _first_mismatch(ref: List[Dict], cand: List[Dict]) -> Optional[int]:
+    """Returns the index of the first differing record, or None if both lists are equal."""
+    if ref == cand:
+        return None
+    for i, (r, c) in enumerate(zip(ref, cand)):
+        if r != c:
+            return i
+    return min(len(ref), len(cand))
+
+def _book_context(engine, product, depth: int) -> Dict:
+    bids, asks = engine.get_book(product, depth)
+    return {'bids': bids, 'asks': asks}
+
+def _replay_prefix(df: pd.DataFrame, engines: List, stop: int, chunk_size: int):
+    """Feeds events [0, stop) to the engines and discards their output chunk by chunk."""
+    for start in range(0, stop, chunk_size):
+        for _, row in df.iloc[start:min(start + chunk_size, stop)].iterrows():
+            for engine in engines:
+                engine.process_event(row)
+        for engine in engines:
+            engine.ticker_data.clear()
+            engine.trades.clear()
+
+def _locate_divergence(rows: List[pd.Series], reference, candidate, first_event: int, offsets: Dict[str, int], depth: int) -> Optional[Dict]:
+    """
+    Replays one chunk on engines brought to the state at its start, comparing the records each
+    event produces, and returns the first divergent event with both books right after it.
+    Records are released after every event, so memory stays bounded by the chunk's book state.
+    Only used once a chunk has diverged, so the normal path pays no per-event comparison cost.
+    Returns None if the chunk replays without diverging.
+    """
+    offsets = dict(offsets)
+    for event_index, row in enumerate(rows, start=first_event):
+        reference.process_event(row)
+        candidate.process_event(row)
+
+        for stream in ('trades', 'ticker_data'):
+            ref_new, cand_new = getattr(reference, stream), getattr(candidate, stream)
+            mismatch = _first_mismatch(ref_new, cand_new)
+            if mismatch is None:
+                offsets[stream] += len(ref_new)
+                ref_new.clear()
+                cand_new.clear()
+                continue
+            product = row['DeliveryStart']
+            return {
+                'stream': stream,
+                'record_index': offsets[stream] + mismatch,
+                'event_index': event_index,
+                'event': row.to_dict(),
+                'reference': ref_new[mismatch] if mismatch < len(ref_new) else None,
+                'candidate': cand_new[mismatch] if mismatch < len(cand_new) else None,
+                'reference_book': _book_context(reference, product, depth),
+                'candidate_book': _book_context(candidate, product, depth),
+            }
+    return None
+
+def run_shadow(df: pd.DataFrame, candidate_factory: Callable, reference_factory: Callable = MatchingEngine,
+               chunk_size: int = SHADOW_CHUNK_SIZE, depth: int = 5) -> Dict:
+    """
+    Runs the reference and a candidate matching engine side by side on the same event stream.
+    Outputs are compared chunk by chunk and released once equal, so memory stays bounded by
+    the chunk size. On the first divergent chunk, fresh engines from the factories replay the events
+    before it with their output discarded, then that chunk event by event to report the exact
+    divergent event with book context. Engines never need to be copyable.
+    If the replay does not diverge, the engines are nondeterministic and the chunk's first mismatch
+    is reported without an event.
+    Returns event counts, per-engine throughput and the divergence (or None).
+    """
+    reference, candidate = reference_factory(), candidate_factory()
+    timings = {'reference': 0.0, 'candidate': 0.0}
+    # Records already compared and released
+    compared = {'ticker_data': 0, 'trades': 0}
+    divergence = None
+    processed = 0
+
+    for start in range(0, len(df), chunk_size):
+        # Rows are materialized once and shared so neither engine is charged for iteration
+        rows = [row for _, row in df.iloc[start:start + chunk_size].iterrows()]
+        for name, engine in (('reference', reference), ('candidate', candidate)):
+            t0 = time.perf_counter()
+            for row in rows:
+                engine.process_event(row)
+            timings[name] += time.perf_counter() - t0
+        processed += len(rows)
+
+        mismatches = {stream: _first_mismatch(getattr(reference, stream), getattr(candidate, stream))
+                      for stream in ('ticker_data', 'trades')}
+        if any(m is not None for m in mismatches.values()):
+            fresh_reference, fresh_candidate = reference_factory(), candidate_factory()
+            _replay_prefix(df, [fresh_reference, fresh_candidate], start, chunk_size)
+            divergence = _locate_divergence(rows, fresh_reference, fresh_candidate, start, compared, depth)
+            if divergence is None:
+                stream = next(s for s, m in mismatches.items() if m is not None)
+                ref_records, cand_records = getattr(reference, stream), getattr(candidate, stream)
+                mismatch = mismatches[stream]
+                divergence = {
+                    'stream': stream,
+                    'record_index': compared[stream] + mismatch,
+                    'event_index': None,
+                    'event': None,
+                    'reference': ref_records[mismatch] if mismatch < len(ref_records) else None,
+                    'candidate': cand_records[mismatch] if mismatch < len(cand_records) else None,
+                    'reference_book': None,
+                    'candidate_book': None,
+                    'nondeterministic': True,
+                }
+            break
+
+        for stream in ('ticker_data', 'trades'):
+            ref_records, cand_records = getattr(reference, stream), getattr(candidate, stream)
+            compared[stream] += len(ref_records)
+            ref_records.clear()
+            cand_records.clear()
+
+    return {
+        'events': processed,
+        'ticker_records': compared['ticker_data'],
+        'trade_records': compared['trades'],
+        'reference_seconds': timings['reference'],
+        'candidate_seconds': timings['candidate'],
+        'reference_events_per_sec': processed / timings['reference'] if timings['reference'] else float('nan'),
+        'candidate_events_per_sec': processed / timings['candidate'] if timings['candidate'] else float('nan'),
+        'divergence': divergence,
+    }
+
+def load_factory(path: str, options: Optional[List[str]] = None) -> Callable:
+    """
+    Imports an engine class from a 'module:Class' path.
+    options are 'name=value' constructor arguments, e.g. ['amend_in_place=False'].
+    """
+    module_name, _, attr = path.partition(':')
+    factory = getattr(importlib.import_module(module_name), attr or 'MatchingEngine')
+    kwargs = {}
+    for option in options or []:
+        name, _, value = option.partition('=')
+        kwargs[name] = ast.literal_eval(value)
+    return functools.partial(factory, **kwargs) if kwargs else factory
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare a candidate matching engine against the reference MatchingEngine.")
+    parser.add_argument('candidate', help="Candidate engine as module:Class")
+    parser.add_argument('dataset', nargs='?', default=DATASET, help="Order file, directory or glob pattern")
+    parser.add_argument('--reference', default='matching_engine:MatchingEngine', help="Reference engine as module:Class")
+    parser.add_argument('--candidate-option', action='append', default=[], metavar='NAME=VALUE', help="Candidate constructor argument (repeatable)")
+    parser.add_argument('--reference-option', action='append', default=[], metavar='NAME=VALUE',
+                        help="Reference constructor argument (repeatable), e.g. amend_in_place=False for the previous amendment path")
+    parser.add_argument('--chunk-size', type=int, default=SHADOW_CHUNK_SIZE, help="Events per comparison chunk")
+    args = parser.parse_args(argv)
+
+    engine = ReplayEngine(args.dataset)
+    engine.load_data()
+    report = run_shadow(engine.df, load_factory(args.candidate, args.candidate_option),
+                        load_factory(args.reference, args.reference_option), args.chunk_size)
+
+    print(f"Compared {report['events']} events, {report['ticker_records']} ticker records and {report['trade_records']} trades.")
+    print(f"Reference: {report['reference_events_per_sec']:.0f} events/s, candidate: {report['candidate_events_per_sec']:.0f} events/s")
+    divergence = report['divergence']
+    if divergence is None:
+        print("No divergence.")
+        return
+    if divergence.get('nondeterministic'):
+        print(f"First divergence in {divergence['stream']} record {divergence['record_index']}, "
+              f"not reproduced when replaying its chunk: an engine is nondeterministic.")
+    else:
+        print(f"First divergence in {divergence['stream']} record {divergence['record_index']} at event {divergence['event_index']}:")
+    for key in ('event', 'reference', 'candidate', 'reference_book', 'candidate_book'):
+        print(f"  {key}: {divergence[key]}")
+    raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+import pandas as pd
+import pyarrow as pa
+from replay_engine import ReplayEngine
+from bars import build_trade_bars
+from dataset import source_state
+from config import DATASET, BAR_FREQS, SHARED_FRAMES_DIR
+
+# Engine frames published for other processes: {attribute: file name}
+TABLES = {'df': 'events.arrow', 'ticker_df': 'ticker.arrow', 'trades_df': 'trades.arrow'}
+# Ticker and trades appended chunk by chunk while matching runs, as Arrow IPC streams
+STREAMS = {'ticker_df': 'ticker.arrows', 'trades_df': 'trades.arrows'}
+MANIFEST = 'manifest.json'
+LOCK = 'publish.lock'
+
+def dataset_dir(dataset: str, root: str = SHARED_FRAMES_DIR) -> str:
+    """Returns the shared directory of a dataset, one per resolved dataset path."""
+    key = hashlib.sha1(os.path.abspath(dataset).encode()).hexdigest()[:16]
+    return os.path.join(root, key)
+
+def _to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Converts a frame to an Arrow table whose buffers pandas can map without copying.
+    Strings are dictionary-encoded so attached processes only map integer codes, and
+    float NaN stays a value rather than becoming a null that would force a copy on read.
+    """
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if values.dtype.kind == 'f':
+            columns[col] = pa.array(values.to_numpy(), from_pandas=False)
+        elif values.dtype.kind == 'O' or pd.api.types.is_string_dtype(values.dtype):
+            columns[col] = pa.Array.from_pandas(values.astype('category'))
+        else:
+            columns[col] = pa.Array.from_pandas(values)
+    return pa.table(columns)
+
+def _write_table(df: pd.DataFrame, path: str):
+    table = _to_arrow(df)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def _read_table(path: str) -> pd.DataFrame:
+    # Memory-mapped and read-only: numeric, timestamp and category code columns are views on the file
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.to_pandas(split_blocks=True)
+
+def _chunk_schemas(events: pd.DataFrame) -> Dict[str, pa.Schema]:
+    """
+    Fixed schemas of the ticker and trades streams, derived from the events they are matched from.
+    Every chunk is written with the same types even when a chunk's own columns came out differently
+    (e.g. object columns of None), and Side shares one dictionary so it is written only once.
+    """
+    # Ticker and trade times come from TransactionTime, products from DeliveryStart
+    time_type, product_type, qty_type = (
+        pa.Array.from_pandas(events[col].iloc[:0]).type for col in ('TransactionTime', 'DeliveryStart', 'Quantity')
+    )
+    ticker = pa.schema([
+        ('Time', time_type), ('Product', product_type), ('BestBid', pa.float64()), ('BestAsk', pa.float64()),
+        ('BestBidQty', qty_type), ('BestAskQty', qty_type),
+    ])
+    trades = pa.schema([
+        ('Time', time_type), ('Product', product_type), ('Price', pa.float64()), ('Quantity', qty_type),
+        ('Side', pa.dictionary(pa.int8(), pa.string())),
+    ])
+    return {'ticker_df': ticker, 'trades_df': trades}
+
+def _to_batch(df: pd.DataFrame, schema: pa.Schema, sides: List[str]) -> pa.RecordBatch:
+    columns = []
+    for field in schema:
+        values = df[field.name]
+        if pa.types.is_dictionary(field.type):
+            codes = pd.Categorical(values, categories=sides).codes.astype('int8')
+            columns.append(pa.DictionaryArray.from_arrays(codes, pa.array(sides, pa.string())))
+        elif pa.types.is_floating(field.type):
+            # NaN stays a value, as in _to_arrow
+            columns.append(pa.array(values.to_numpy(dtype='float64'), from_pandas=False))
+        else:
+            columns.append(pa.array(values).cast(field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+def _read_batches(path: str, start: int, stop: int) -> List[pd.DataFrame]:
+    """Returns batches start..stop-1 of a stream file as frames mapped from the file."""
+    reader = pa.ipc.open_stream(pa.memory_map(path, 'r'))
+    frames = []
+    for i in range(stop):
+        batch = reader.read_next_batch()
+        if i >= start:
+            frames.append(batch.to_pandas(split_blocks=True))
+    return frames
+
+def _write_manifest(base: str, manifest: Dict):
+    # Written aside and renamed so readers never see a partial manifest
+    tmp_path = os.path.join(base, f"{MANIFEST}.{manifest['version']}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(base, MANIFEST))
+
+def _read_manifest(base: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(base, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+class SharedBuild:
+    """
+    Publishes an engine's frames while it is being precomputed.
+    The events are written first; each matched chunk is then appended to the ticker and trades
+    streams and the manifest records how many chunks are complete, so other processes can attach
+    to the processed part and follow it. finish() writes the final tables and marks the build done.
+    Each build goes to a new version directory and the manifest is swapped atomically, so processes
+    attached to an older version keep reading consistent files.
+    Only the holder of the publisher lock may run a build (see load_shared_engine and publish_engine).
+    """
+    def __init__(self, engine: ReplayEngine, root: str = SHARED_FRAMES_DIR):
+        self.engine = engine
+        self.base = dataset_dir(engine.filepath, root)
+        self.version = uuid.uuid4().hex
+        self.version_dir = os.path.join(self.base, self.version)
+        os.makedirs(self.version_dir)
+
+        _write_table(engine.df, os.path.join(self.version_dir, TABLES['df']))
+        self.schemas = _chunk_schemas(engine.df)
+        self.sides = sorted(engine.df['Side'].astype(str).unique())
+        self.sinks = {attr: pa.OSFile(os.path.join(self.version_dir, name), 'wb') for attr, name in STREAMS.items()}
+        self.writers = {attr: pa.ipc.new_stream(self.sinks[attr], self.schemas[attr]) for attr in STREAMS}
+        self.closed = False
+        self.manifest = {
+            'dataset': engine.filepath,
+            'sources': source_state(engine.files),
+            'version': self.version,
+            'done': False,
+            'batches': {attr: 0 for attr in STREAMS},
+            'processed': 0,
+            'total': len(engine.df),
+            'processed_until': None,
+            # Wall clock, so followers can report elapsed time and ETA
+            'started': time.time(),
+        }
+        _write_manifest(self.base, self.manifest)
+
+    def append(self, new_ticker: pd.DataFrame, new_trades: pd.DataFrame):
+        """Appends one matched chunk; usable as the on_chunk callback of precompute_ticker."""
+        for attr, chunk in (('ticker_df', new_ticker), ('trades_df', new_trades)):
+            if chunk.empty:
+                continue
+            self.writers[attr].write_batch(_to_batch(chunk, self.schemas[attr], self.sides))
+            # Complete before the manifest counts it
+            self.sinks[attr].flush()
+            self.manifest['batches'][attr] += 1
+        self.manifest['processed'] = self.engine.events_processed
+        until = self.engine.processed_until
+        self.manifest['processed_until'] = until.isoformat() if until is not None else None
+        _write_manifest(self.base, self.manifest)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for attr in STREAMS:
+            self.writers[attr].close()
+            self.sinks[attr].close()
+
+    def finish(self) -> str:
+        """
+        Writes the final ticker and trades, marks the build done and drops older versions.
+        The engine is then switched onto the memory-mapped frames so this process does not keep
+        its own copy next to the published one. Returns the version directory.
+        """
+        engine = self.engine
+        self.close()
+        for attr in ('ticker_df', 'trades_df'):
+            _write_table(getattr(engine, attr), os.path.join(self.version_dir, TABLES[attr]))
+        self.manifest.update(done=True, processed=len(engine.df), processed_until=engine.df['TransactionTime'].max().isoformat())
+        _write_manifest(self.base, self.manifest)
+
+        # The streams and older finished versions can go; on POSIX attached processes keep their mappings alive
+        for name in STREAMS.values():
+            os.remove(os.path.join(self.version_dir, name))
+        _remove_versions(self.base, lambda version_dir: version_dir != self.version_dir and _version_done(version_dir))
+
+        frames = {attr: _read_table(os.path.join(self.version_dir, name)) for attr, name in TABLES.items()}
+        # Bars were built from the same trades and are kept; trades go before ticker as in _publish_results
+        engine.trades_df = frames['trades_df']
+        engine.ticker_df = frames['ticker_df']
+        engine.df = frames['df']
+        return self.version_dir
+
+def _version_done(version_dir: str) -> bool:
+    # finish() writes the final tables before marking the build done in the manifest
+    return all(os.path.exists(os.path.join(version_dir, TABLES[attr])) for attr in STREAMS)
+
+def _remove_versions(base: str, removable: Callable[[str], bool]):
+    for entry in os.listdir(base):
+        path = os.path.join(base, entry)
+        if os.path.isdir(path) and removable(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+def publish_engine(engine: ReplayEngine, root: str = SHARED_FRAMES_DIR) -> str:
+    """
+    Publishes a loaded and precomputed engine's frames as Arrow IPC files and switches the engine
+    onto the published frames. Waits for a build in progress to finish first, as only the
+    holder of the publisher lock may publish. Returns the version directory.
+    """
+    base = dataset_dir(engine.filepath, root)
+    os.makedirs(base, exist_ok=True)
+    lock_fd = _acquire_lock(os.path.join(base, LOCK), blocking=True)
+    try:
+        return SharedBuild(engine, root).finish()
+    finally:
+        _release_lock(lock_fd)
+
+def _lock_held(path: str) -> bool:
+    """Returns True while another open file holds the publisher lock, i.e. a publisher is alive."""
+    fd = _acquire_lock(path)
+    if fd is None:
+        return True
+    _release_lock(fd)
+    return False
+
+def attach_engine(dataset: str, root: str = SHARED_FRAMES_DIR, follow: bool = False, poll: float = 1.0) -> Optional[ReplayEngine]:
+    """
+    Builds a ReplayEngine on top of published frames without copying them.
+    With follow=True a build that is still being precomputed is attached as well, as long as its
+    publisher is alive: the engine starts with the chunks matched so far and a background thread
+    extends it as the publisher appends chunks, until the build is done.
+    Returns None if nothing usable was published for the dataset or the sources changed since.
+    """
+    base = dataset_dir(dataset, root)
+    manifest = _read_manifest(base)
+    if manifest is None:
+        return None
+    engine = ReplayEngine(dataset)
+    # Published frames are stale once any source file changes
+    if manifest.get('sources') != source_state(engine.files):
+        return None
+    if not manifest['done'] and not (follow and _lock_held(os.path.join(base, LOCK))):
+        return None
+
+    version_dir = os.path.join(base, manifest['version'])
+    try:
+        engine.df = _read_table(os.path.join(version_dir, TABLES['df']))
+        if manifest['done']:
+            engine.ticker_df = _read_table(os.path.join(version_dir, TABLES['ticker_df']))
+            engine.trades_df = _read_table(os.path.join(version_dir, TABLES['trades_df']))
+        else:
+            engine._reset_progress()
+            for attr, chunks in (('trades_df', engine._trades), ('ticker_df', engine._ticker)):
+                for frame in _read_batches(os.path.join(version_dir, STREAMS[attr]), 0, manifest['batches'][attr]):
+                    chunks.append(frame)
+    except (FileNotFoundError, KeyError, OSError):
+        # The build was replaced or finished while reading; the caller retries
+        return None
+
+    engine._init_metadata()
+    if manifest['done']:
+        engine.bars = build_trade_bars(engine.trades_df, BAR_FREQS)
+        engine.events_processed = len(engine.df)
+        engine.processed_until = engine.df['TransactionTime'].max()
+        engine.precompute_done = True
+        return engine
+
+    _apply_progress(engine, manifest)
+    threading.Thread(target=_follow, args=(engine, base, manifest, poll), name=f"follow-{dataset}", daemon=True).start()
+    return engine
+
+def _apply_progress(engine: ReplayEngine, manifest: Dict):
+    engine.events_processed = manifest['processed']
+    until = manifest['processed_until']
+    engine.processed_until = pd.Timestamp(until) if until is not None else None
+    # Measure elapsed time from the publisher's start rather than from attaching
+    engine._precompute_started = time.perf_counter() - (time.time() - manifest['started'])
+
+def _follow(engine: ReplayEngine, base: str, manifest: Dict, poll: float):
+    """Extends a following engine with the chunks its publisher appends, until the build is done or abandoned."""
+    try:
+        _follow_build(engine, base, manifest, poll)
+    except BaseException as e:
+        # Nothing may end the thread silently, or the app keeps waiting on a build that no longer advances
+        engine.precompute_error = e
+        raise
+
+def _follow_build(engine: ReplayEngine, base: str, manifest: Dict, poll: float):
+    version_dir = os.path.join(base, manifest['version'])
+    read = dict(manifest['batches'])
+    while True:
+        time.sleep(poll)
+        publisher_alive = _lock_held(os.path.join(base, LOCK))
+        # Read after the liveness check, so a publisher that finished and exited is seen as done
+        current = _read_manifest(base)
+        if current is None or current['version'] != manifest['version']:
+            engine.precompute_error = RuntimeError("The shared build was replaced; reload the app to attach to the new one")
+            return
+
+        if current['done']:
+            try:
+                trades_df = _read_table(os.path.join(version_dir, TABLES['trades_df']))
+                ticker_df = _read_table(os.path.join(version_dir, TABLES['ticker_df']))
+            except (FileNotFoundError, OSError) as e:
+                engine.precompute_error = e
+                return
+            engine._publish_results(ticker_df, trades_df, build_trade_bars(trades_df, BAR_FREQS))
+            _apply_progress(engine, current)
+            engine.precompute_done = True
+            return
+
+        if not publisher_alive:
+            engine.precompute_error = RuntimeError("The publishing process stopped before matching finished")
+            return
+
+        try:
+            for attr, chunks in (('trades_df', engine._trades), ('ticker_df', engine._ticker)):
+                stop = current['batches'][attr]
+                if stop > read[attr]:
+                    for frame in _read_batches(os.path.join(version_dir, STREAMS[attr]), read[attr], stop):
+                        chunks.append(frame)
+                    read[attr] = stop
+        except (OSError, pa.ArrowInvalid):
+            # finish() removes the streams right after marking the build done; the next poll takes the done branch
+            continue
+        engine.bars = {}
+        _apply_progress(engine, current)
+
+def _acquire_lock(path: str, blocking: bool = False) -> Optional[int]:
+    """
+    Takes the publisher lock and returns its file descriptor, or None if it is held and blocking is False.
+    flock is tied to the open file, so the kernel releases it when the holder exits or dies.
+    """
+    fd = os.open(path, os.O_CREAT | os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except BlockingIOError:
+        os.close(fd)
+        return None
+
+def _release_lock(fd: int):
+    # Closing the descriptor releases the flock; the lock file itself stays for the next publisher
+    os.close(fd)
+
+def load_shared_engine(dataset: str = DATASET, root: str = SHARED_FRAMES_DIR, poll: float = 1.0, background: bool = False) -> ReplayEngine:
+    """
+    Attaches to the published engine for a dataset, or loads, precomputes and publishes it
+    if this is the first process to ask. Matched chunks are published as they are produced.
+    With background=True every process returns as soon as the events are available: the publisher
+    keeps matching in a background thread and other processes attach to the partial build and
+    follow it. Otherwise the call returns once the build is done.
+    """
+    base = dataset_dir(dataset, root)
+    os.makedirs(base, exist_ok=True)
+    lock_path = os.path.join(base, LOCK)
+
+    while True:
+        engine = attach_engine(dataset, root, follow=background, poll=poll)
+        if engine is not None:
+            return engine
+        lock_fd = _acquire_lock(lock_path)
+        if lock_fd is not None:
+            break
+        time.sleep(poll)
+
+    try:
+        # Another process may have published between our attach attempt and taking the lock.
+        # Not following: an unfinished build found now was abandoned by a publisher that died.
+        engine = attach_engine(dataset, root)
+        if engine is not None:
+            _release_lock(lock_fd)
+            return engine
+        # Drop the old manifest so nobody follows an abandoned build while we hold the lock,
+        # and the abandoned builds themselves: with the lock held, nobody else is writing one
+        try:
+            os.remove(os.path.join(base, MANIFEST))
+        except FileNotFoundError:
+            pass
+        _remove_versions(base, lambda version_dir: not _version_done(version_dir))
+        engine = ReplayEngine(dataset)
+        engine.load_data()
+        build = SharedBuild(engine, root)
+    except BaseException:
+        _release_lock(lock_fd)
+        raise
+
+    if background:
+        # The lock is held until the background matching has been published (or has failed)
+        def finish(thread: threading.Thread):
+            thread.join()
+            try:
+                if engine.precompute_done:
+                    build.finish()
+                else:
+                    build.close()
+            except BaseException as e:
+                engine.precompute_error = e
+                raise
+            finally:
+                _release_lock(lock_fd)
+
+        threading.Thread(target=finish, args=(engine.start_precompute(on_chunk=build.append),), daemon=True).start()
+        return engine
+
+    try:
+        engine.precompute_ticker(on_chunk=build.append)
+        build.finish()
+    except BaseException:
+        build.close()
+        raise
+    finally:
+        _release_lock(lock_fd)
+    return engine
+
+if __name__ == "__main__":
+    # Loader process: python shared_frames.py [dataset]
+    # Takes the publisher lock like the apps, so it never replaces a build an app is streaming
+    dataset = sys.argv[1] if len(sys.argv) > 1 else DATASET
+    engine = load_shared_engine(dataset)
+    print(f"Published {dataset} to {dataset_dir(dataset)} ({len(engine.ticker_df)} ticker events, {len(engine.trades_df)} trades)")
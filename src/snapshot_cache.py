@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional
+import pandas as pd
+
+class SnapshotCache:
+    """
+    Thread-safe LRU cache for order book snapshots, bounded by memory.
+    A single instance is shared by every ReplayEngine in the process, so
+    concurrent Streamlit sessions reuse each other's snapshots.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # Key -> (DataFrame, size in bytes), oldest first
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Key -> Future of a computation in progress, so concurrent misses share one computation
+        self._inflight: Dict[Hashable, Future] = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.waits = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Returns the cached snapshot for key, computing and storing it on a miss.
+        Callers asking for a key that is already being computed wait for that result instead of recomputing it.
+        The returned DataFrame is shared between callers and must not be modified.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                self.misses += 1
+                owner = True
+            else:
+                self.waits += 1
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        # Compute outside the lock so other keys are not blocked meanwhile
+        try:
+            snapshot = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            pending.set_exception(e)
+            raise
+        size = int(snapshot.memory_usage(deep=True).sum())
+
+        with self._lock:
+            del self._inflight[key]
+            if size <= self.max_bytes:
+                self._entries[key] = (snapshot, size)
+                self.current_bytes += size
+                self._evict()
+        pending.set_result(snapshot)
+        return snapshot
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def clear(self, dataset: Optional[str] = None):
+        """Drops all entries, or only those whose key starts with the given dataset."""
+        with self._lock:
+            if dataset is None:
+                self._entries.clear()
+                self.current_bytes = 0
+                return
+            for key in [k for k in self._entries if k[0] == dataset]:
+                _, size = self._entries.pop(key)
+                self.current_bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
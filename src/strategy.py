@@ -1,45 +1,46 @@
 import pandas as pd
 from datetime import timedelta
+from typing import Optional
+from bars import build_trade_bars, product_bars, check_bar_freq, BAR_ORIGIN
 
-def prepare_data_for_strategy(ticker_df: pd.DataFrame, trades_df: pd.DataFrame, product: str, freq: str = '1min') -> pd.DataFrame:
+def prepare_data_for_strategy(ticker_df: pd.DataFrame, trades_df: pd.DataFrame, product: str, freq: str = '1min', bars: Optional[pd.DataFrame] = None) -> pd.DataFrame:
     """
     Prepares the ticker data for the Dual Thrust strategy by resampling it to a fixed frequency.
+    Trade statistics come from precomputed trade bars at the same frequency if given (ValueError otherwise),
+    else they are built from the product's trades in trades_df.
     """
     # Filter for the specific product
     p_data = ticker_df[ticker_df['Product'] == product].copy() if not ticker_df.empty else pd.DataFrame()
-    p_trades = trades_df[trades_df['Product'] == product].copy() if not trades_df.empty else pd.DataFrame()
     
     if p_data.empty:
         return pd.DataFrame()
 
     # Set index to Time
     p_data = p_data.set_index('Time').sort_index()
-    if not p_trades.empty:
-        p_trades = p_trades.set_index('Time').sort_index()
     
     # Resample Ticker (State) -> Take Last and ffill
-    # We include BestBidQty and BestAskQty
-    resampled = p_data[['BestBid', 'BestAsk', 'BestBidQty', 'BestAskQty']].resample(freq).last().ffill()
-    
-    # Resample Trades (Events) -> Sum Quantity
-    if not p_trades.empty:
-        traded_vol = p_trades['Quantity'].resample(freq).sum()
-        buy_vol = p_trades[p_trades['Side'] == 'BUY']['Quantity'].resample(freq).sum()
-        sell_vol = p_trades[p_trades['Side'] == 'SELL']['Quantity'].resample(freq).sum()
+    # We include BestBidQty and BestAskQty; binned from the same origin as the trade bars
+    resampled = p_data[['BestBid', 'BestAsk', 'BestBidQty', 'BestAskQty']].resample(freq, origin=BAR_ORIGIN).last().ffill()
+    
+    # Trade bars (Events) -> OHLC, volumes and trade VWAP
+    if bars is None:
+        p_trades = trades_df[trades_df['Product'] == product] if not trades_df.empty else trades_df
+        bars = build_trade_bars(p_trades, [freq])[freq]
     else:
-        traded_vol = pd.Series(0, index=resampled.index)
-        buy_vol = pd.Series(0, index=resampled.index)
-        sell_vol = pd.Series(0, index=resampled.index)
+        check_bar_freq(bars, freq)
     
     # Align indices
-    # Ensure traded_vol has same index as resampled (fill missing with 0)
-    traded_vol = traded_vol.reindex(resampled.index, fill_value=0)
-    buy_vol = buy_vol.reindex(resampled.index, fill_value=0)
-    sell_vol = sell_vol.reindex(resampled.index, fill_value=0)
-    
-    resampled['traded_qty'] = traded_vol
-    resampled['buy_vol'] = buy_vol
-    resampled['sell_vol'] = sell_vol
+    # Ensure trade bars have same index as resampled (bars without trades get zero volume)
+    p_bars = product_bars(bars, product).reindex(resampled.index)
+    
+    resampled['traded_qty'] = p_bars['volume'].fillna(0)
+    resampled['buy_vol'] = p_bars['buy_vol'].fillna(0)
+    resampled['sell_vol'] = p_bars['sell_vol'].fillna(0)
+    resampled['trade_count'] = p_bars['trade_count'].fillna(0).astype(int)
+    resampled['open'] = p_bars['open']
+    resampled['high'] = p_bars['high']
+    resampled['low'] = p_bars['low']
+    resampled['close'] = p_bars['close']
     
     # Calculate Mid
     resampled['mid'] = (resampled['BestBid'] + resampled['BestAsk']) / 2
@@ -52,15 +53,12 @@ def prepare_data_for_strategy(ticker_df: pd.DataFrame, trades_df: pd.DataFrame,
         'BestAskQty': 'ask_qty'
     })
     
-    # Calculate VWAP (Volume Weighted Average Price) based on the order book
-    resampled['vwap'] = (
-        (resampled['best_bid'] * resampled['bid_qty'] + resampled['best_ask'] * resampled['ask_qty']) /
-        (resampled['bid_qty'] + resampled['ask_qty']).replace(0, float('nan'))  # Avoid division by zero
-    )
+    # VWAP (Volume Weighted Average Price) of the trades in each bar, NaN where nothing traded
+    resampled['vwap'] = p_bars['vwap']
 
     # Calculate total buy/sell depth
-    resampled['total_bid_depth'] = p_data['BestBidQty'].resample(freq).sum()
-    resampled['total_ask_depth'] = p_data['BestAskQty'].resample(freq).sum()
+    resampled['total_bid_depth'] = p_data['BestBidQty'].resample(freq, origin=BAR_ORIGIN).sum()
+    resampled['total_ask_depth'] = p_data['BestAskQty'].resample(freq, origin=BAR_ORIGIN).sum()
 
     return resampled
 
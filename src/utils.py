@@ -1,10 +1,38 @@
 import streamlit as st
-from replay_engine import ReplayEngine
-from config import FILEPATH
+from shared_frames import load_shared_engine
+from config import DATASET, PROGRESS_REFRESH_SECONDS
 
 @st.cache_resource
 def load_engine():
-    engine = ReplayEngine(FILEPATH)
-    engine.load_data()
-    engine.precompute_ticker()
-    return engine
+    # Attach to the frames published by the first process on this host instead of rebuilding them.
+    # Every process returns once events are available: the first keeps matching in the background,
+    # the others follow the chunks it publishes.
+    return load_shared_engine(DATASET, background=True)
+
+def render_precompute_progress(engine):
+    """
+    Shows matching progress and ETA while the engine is still precomputing.
+    The progress bar refreshes itself every PROGRESS_REFRESH_SECONDS without blocking the script,
+    and reruns the app whenever more events have been matched so views extend as matching catches up.
+    """
+    progress = engine.get_progress()
+    # Progress the views of this run are drawn from; fragment reruns keep the argument
+    _precompute_progress(engine, (progress['processed'], progress['done']))
+
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def _precompute_progress(engine, shown: tuple):
+    progress = engine.get_progress()
+    if progress['error'] is not None:
+        st.error(f"Precompute failed: {progress['error']}")
+        return
+    if (progress['processed'], progress['done']) != shown:
+        st.rerun()
+    if progress['done']:
+        return
+
+    until = progress['processed_until'].strftime('%Y-%m-%d %H:%M:%S') if progress['processed_until'] is not None else "-"
+    eta = f"{progress['eta']:.0f}s" if progress['eta'] is not None else "estimating..."
+    st.progress(
+        progress['fraction'],
+        text=f"Matching {progress['processed']:,}/{progress['total']:,} events. Data available up to {until}, ETA {eta}"
+    )